@@ -2,63 +2,111 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import importlib.util
 import json
+import os
 import re
 import shutil
-from dataclasses import dataclass
-from datetime import datetime
+import socket
+import subprocess
+import sys
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 from playwright.sync_api import sync_playwright
 
-SAMPLE_RE = re.compile(r"^sample_(\d{3})$")
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
 
 # --- Simple regex helpers (fast, no external deps) ---
-TITLE_RE = re.compile(r"<title>(?P<t>.*?)</title>", re.I | re.S)
-H1_RE = re.compile(r"<h1[^>]*>(?P<t>.*?)</h1>", re.I | re.S)
-LABEL_RE = re.compile(r"<label[^>]*for=\"(?P<for>[^\"]+)\"[^>]*>(?P<txt>.*?)</label>", re.I | re.S)
-INPUT_RE = re.compile(r"<input(?P<attrs>[^>]*)>", re.I)
-BUTTON_RE = re.compile(r"<button(?P<attrs>[^>]*)>(?P<txt>.*?)</button>", re.I | re.S)
-A_RE = re.compile(r"<a(?P<attrs>[^>]*)>(?P<txt>.*?)</a>", re.I | re.S)
-DIV_RE = re.compile(r"<div(?P<attrs>[^>]*)>(?P<txt>.*?)</div>", re.I | re.S)
-ID_ATTR_RE = re.compile(r'\bid\s*=\s*"(?P<id>[^"]+)"', re.I)
-FOR_ATTR_RE = re.compile(r'\bfor\s*=\s*"(?P<for>[^"]+)"', re.I)
-TYPE_ATTR_RE = re.compile(r'\btype\s*=\s*"(?P<type>[^"]+)"', re.I)
-ROLE_ATTR_RE = re.compile(r'\brole\s*=\s*"(?P<role>[^"]+)"', re.I)
+# Every pattern the module uses is compiled here, once, and called via .search/.findall/.finditer.
+# The elements parse_dom() reads, as one alternation scanned once with finditer;
+# the text group closes last, so m.lastgroup names the element that matched.
+COMBINED_RE = re.compile(
+    r"<title[^>]*>(?P<title>.*?)</title>"
+    r"|<h1\b(?P<h1_attrs>[^>]*)>(?P<h1>.*?)</h1>"
+    r"|<label\b(?P<label_attrs>[^>]*)>(?P<label>.*?)</label>"
+    r"|<input\b(?P<input>[^>]*)>"
+    r"|<button\b(?P<button_attrs>[^>]*)>(?P<button>.*?)</button>"
+    r"|<a\b(?P<a_attrs>[^>]*)>(?P<a>.*?)</a>"
+    r"|<div\b(?P<alert_attrs>[^>]*\srole\s*=\s*\"alert\"[^>]*)>(?P<alert>.*?)</div>"
+    r"|<style[^>]*>(?P<style>.*?)</style>"
+    # inline style="..." on any other start tag
+    r"|<[a-z][^>]*?\sstyle\s*=\s*\"(?P<style_attr>[^\"]*)\"[^>]*>",
+    re.I | re.S,
+)
+# name="value" pairs inside a start tag
+_ATTR_RE = re.compile(r'([\w:.-]+)\s*=\s*"([^"]*)"')
 STYLE_CARD_HINT_RE = re.compile(r"\.card\s*\{(?P<body>.*?)\}", re.I | re.S)
-CSS_VALUE_RE = lambda prop: re.compile(rf"{re.escape(prop)}\s*:\s*([^;]+);", re.I)
+# /* ... */ comments, removed before a CSS block is tokenized
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+# one `prop: value;` declaration inside a CSS block, anchored to the start of the block or the previous `;`
+_CSS_DECL_RE = re.compile(r"(?:^|(?<=;))\s*([a-z-]+)\s*:\s*([^;]+);", re.I)
+# old/new ids out of a drafted "Button ID changed" description
+_BTN_ID_RE = re.compile(r"Button ID changed from '([^']+)' to '([^']+)'")
 
-# style/layout hints we can extract from embedded CSS (best-effort)
-CARD_PROPS = ["padding", "border-radius", "box-shadow", "width"]
-BTN_PROPS = ["background-color", "padding", "border-radius"]
+_UTC = timezone.utc
 
+# draft_changes stops collecting after this many changes to keep drafts readable
+MAX_CHANGES = 30
 
-def strip_tags(text: str) -> str:
-    text = re.sub(r"<[^>]+>", "", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+# input attributes compared by draft_changes, in the order DomSnapshot.inputs stores them
+INPUT_ATTRS = ("type", "aria-required", "aria-describedby", "minlength")
 
 
-def get_attr(attrs: str, name: str) -> Optional[str]:
-    # very small extractor
-    m = re.search(rf'\b{name}\s*=\s*"([^"]+)"', attrs, re.I)
-    return m.group(1) if m else None
+def strip_tags(text: str) -> str:
+    # drop <...> runs and collapse whitespace; str.find/str.split instead of two regex passes
+    out: List[str] = []
+    i = 0
+    n = len(text)
+    while i < n:
+        lt = text.find("<", i)
+        if lt < 0:
+            out.append(text[i:])
+            break
+        out.append(text[i:lt])
+        gt = text.find(">", lt + 1)
+        if gt < 0:
+            # unterminated tag: keep the rest as text
+            out.append(text[lt:])
+            break
+        if gt == lt + 1:
+            # "<>" isn't a tag
+            out.append("<>")
+        i = gt + 1
+    return " ".join("".join(out).split())
+
+
+def dump_json(obj: dict) -> bytes:
+    # 2-space indent + trailing newline, UTF-8 kept as-is (same layout as the hand-written samples)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
 
 
 def utc_now() -> str:
-    return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    return datetime.now(_UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
 def find_highest_sample_number(examples_dir: Path) -> int:
+    # sample dirs are exactly "sample_NNN"; scandir's is_dir() uses the cached d_type
     highest = 0
-    if not examples_dir.exists():
+    try:
+        it = os.scandir(examples_dir)
+    except FileNotFoundError:
         return 0
-    for p in examples_dir.iterdir():
-        if p.is_dir():
-            m = SAMPLE_RE.match(p.name)
-            if m:
-                highest = max(highest, int(m.group(1)))
+    with it:
+        for e in it:
+            n = e.name
+            if len(n) == 10 and n.startswith("sample_") and n[7:].isdecimal() and e.is_dir():
+                v = int(n[7:])
+                if v > highest:
+                    highest = v
     return highest
 
 
@@ -67,13 +115,61 @@ def require_file(path: Path, label: str) -> None:
         raise FileNotFoundError(f"{label} not found: {path}")
 
 
-@dataclass
+# Change.type values (kept as shared module constants so comparisons are identity checks)
+CHG_TEXT = sys.intern("text_change")
+CHG_LABEL = sys.intern("label_change")
+CHG_ID = sys.intern("id_change")
+CHG_ATTR = sys.intern("attribute_change")
+CHG_ADDED = sys.intern("element_addition")
+CHG_REMOVED = sys.intern("element_removal")
+CHG_LAYOUT = sys.intern("layout_change")
+CHG_STYLE = sys.intern("style_change")
+
+
+# Categories classify_changes() looks for when drafting test impact / new tests
+FLAG_TITLE = 1 << 0
+FLAG_H1 = 1 << 1
+FLAG_INPUT_TYPE = 1 << 2
+FLAG_EMAIL_TYPE = 1 << 3
+FLAG_USERNAME = 1 << 4
+FLAG_VISUAL = 1 << 5
+FLAG_A11Y = 1 << 6
+FLAG_ADDED = 1 << 7
+FLAG_ALERT = 1 << 8
+FLAG_NEW_LINK = 1 << 9
+FLAG_BY_TYPE = {CHG_STYLE: FLAG_VISUAL, CHG_LAYOUT: FLAG_VISUAL, CHG_ADDED: FLAG_ADDED}
+
+
+@dataclass(frozen=True)
 class Change:
+    # slots declared by hand (dataclass(slots=True) needs Python 3.10+)
+    __slots__ = ("type", "description", "selector")
+
     type: str
     description: str
     selector: str
 
 
+class BoundedList(list):
+    # list that stops accepting items once `cap` is reached; add() reports whether the
+    # item was kept so callers only count what actually ends up in the list
+    __slots__ = ("cap",)
+
+    def __init__(self, cap: int) -> None:
+        super().__init__()
+        self.cap = cap
+
+    @property
+    def full(self) -> bool:
+        return len(self) >= self.cap
+
+    def add(self, item) -> bool:
+        if len(self) >= self.cap:
+            return False
+        self.append(item)
+        return True
+
+
 @dataclass
 class ChangeSummary:
     text_changes: int = 0
@@ -83,147 +179,194 @@ class ChangeSummary:
     elements_removed: int = 0
     attribute_changes: int = 0
 
-    def as_dict(self) -> dict:
-        return {
-            "text_changes": self.text_changes,
-            "style_changes": self.style_changes,
-            "layout_changes": self.layout_changes,
-            "elements_added": self.elements_added,
-            "elements_removed": self.elements_removed,
-            "attribute_changes": self.attribute_changes,
-        }
 
+@dataclass
+class DomSnapshot:
+    title: Optional[str] = None
+    h1: Optional[str] = None
+    labels: Dict[str, str] = field(default_factory=dict)
+    # id -> attribute values in INPUT_ATTRS order
+    inputs: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    # id -> (text, aria-label)
+    buttons: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    links: List[str] = field(default_factory=list)
+    alerts: List[Tuple[str, str]] = field(default_factory=list)
+    css_blocks: List[str] = field(default_factory=list)
 
-def extract_title(html: str) -> Optional[str]:
-    m = TITLE_RE.search(html)
-    return strip_tags(m.group("t")) if m else None
 
+def _attrs(raw: str) -> Dict[str, str]:
+    return {k.lower(): v for k, v in _ATTR_RE.findall(raw)}
 
-def extract_h1(html: str) -> Optional[str]:
-    m = H1_RE.search(html)
-    return strip_tags(m.group("t")) if m else None
 
+def _inline_style(snap: DomSnapshot, a: Dict[str, str]) -> None:
+    # inline declarations count as CSS too (e.g. the button colour check in draft_changes)
+    if a.get("style"):
+        snap.css_blocks.append(a["style"])
 
-def extract_labels(html: str) -> Dict[str, str]:
-    labels = {}
-    for m in LABEL_RE.finditer(html):
-        key = m.group("for")
-        labels[key] = strip_tags(m.group("txt"))
-    return labels
 
+def _dom_title(snap: DomSnapshot, m: re.Match) -> None:
+    if snap.title is None:
+        snap.title = strip_tags(m.group("title"))
 
-def extract_inputs_by_id(html: str) -> Dict[str, Dict[str, str]]:
-    # Map id -> attrs(dict-ish)
-    inputs: Dict[str, Dict[str, str]] = {}
-    for m in INPUT_RE.finditer(html):
-        attrs = m.group("attrs")
-        _id = get_attr(attrs, "id")
-        if not _id:
-            continue
-        inputs[_id] = {
-            "type": get_attr(attrs, "type") or "",
-            "aria-required": get_attr(attrs, "aria-required") or "",
-            "aria-describedby": get_attr(attrs, "aria-describedby") or "",
-            "minlength": get_attr(attrs, "minlength") or "",
-        }
-    return inputs
-
-
-def extract_button_by_id(html: str) -> Dict[str, Dict[str, str]]:
-    buttons: Dict[str, Dict[str, str]] = {}
-    for m in BUTTON_RE.finditer(html):
-        attrs = m.group("attrs")
-        _id = get_attr(attrs, "id")
-        if not _id:
-            continue
-        buttons[_id] = {
-            "text": strip_tags(m.group("txt")),
-            "aria-label": get_attr(attrs, "aria-label") or "",
-        }
-    return buttons
+
+def _dom_h1(snap: DomSnapshot, m: re.Match) -> None:
+    inner = m.group("h1")
+    _inline_style(snap, _attrs(m.group("h1_attrs")))
+    if snap.h1 is None:
+        snap.h1 = strip_tags(inner)
+    _scan_dom(inner, snap)
+
+
+def _dom_label(snap: DomSnapshot, m: re.Match) -> None:
+    inner = m.group("label")
+    a = _attrs(m.group("label_attrs"))
+    _inline_style(snap, a)
+    key = a.get("for")
+    if key:
+        snap.labels[key] = strip_tags(inner)
+    _scan_dom(inner, snap)
 
 
-def extract_links_texts(html: str) -> List[str]:
-    out = []
-    for m in A_RE.finditer(html):
-        out.append(strip_tags(m.group("txt")))
-    return [t for t in out if t]
+def _dom_input(snap: DomSnapshot, m: re.Match) -> None:
+    a = _attrs(m.group("input"))
+    _inline_style(snap, a)
+    _id = a.get("id")
+    if _id:
+        snap.inputs[_id] = tuple(a.get(k, "") for k in INPUT_ATTRS)
 
 
-def find_alert_like_divs(html: str) -> List[Tuple[str, str]]:
-    # Returns (id, text) for divs with role="alert"
-    out = []
-    for m in DIV_RE.finditer(html):
-        attrs = m.group("attrs")
-        role = get_attr(attrs, "role")
-        if (role or "").lower() != "alert":
-            continue
-        _id = get_attr(attrs, "id") or ""
-        out.append((_id, strip_tags(m.group("txt"))))
-    return out
+def _dom_button(snap: DomSnapshot, m: re.Match) -> None:
+    inner = m.group("button")
+    a = _attrs(m.group("button_attrs"))
+    _inline_style(snap, a)
+    if a.get("id"):
+        snap.buttons[a["id"]] = (strip_tags(inner), a.get("aria-label", ""))
+    _scan_dom(inner, snap)
 
 
-def extract_css_block(html: str, selector: str) -> Optional[str]:
+def _dom_link(snap: DomSnapshot, m: re.Match) -> None:
+    inner = m.group("a")
+    _inline_style(snap, _attrs(m.group("a_attrs")))
+    text = strip_tags(inner)
+    if text:
+        snap.links.append(text)
+    _scan_dom(inner, snap)
+
+
+def _dom_alert(snap: DomSnapshot, m: re.Match) -> None:
+    inner = m.group("alert")
+    a = _attrs(m.group("alert_attrs"))
+    _inline_style(snap, a)
+    snap.alerts.append((a.get("id", ""), strip_tags(inner)))
+    _scan_dom(inner, snap)
+
+
+def _dom_style(snap: DomSnapshot, m: re.Match) -> None:
+    snap.css_blocks.append(m.group("style"))
+
+
+def _dom_style_attr(snap: DomSnapshot, m: re.Match) -> None:
+    snap.css_blocks.append(m.group("style_attr"))
+
+
+# COMBINED_RE group name -> handler
+_DOM_HANDLERS = {
+    "title": _dom_title,
+    "h1": _dom_h1,
+    "label": _dom_label,
+    "input": _dom_input,
+    "button": _dom_button,
+    "a": _dom_link,
+    "alert": _dom_alert,
+    "style": _dom_style,
+    "style_attr": _dom_style_attr,
+}
+
+
+def _scan_dom(html: str, snap: DomSnapshot) -> None:
+    # a match consumes its element, so handlers rescan their inner HTML for nested elements
+    if "<" not in html:
+        return
+    for m in COMBINED_RE.finditer(html):
+        _DOM_HANDLERS[m.lastgroup](snap, m)
+
+
+def parse_dom(html: str) -> DomSnapshot:
+    snap = DomSnapshot()
+    _scan_dom(html, snap)
+    return snap
+
+
+def extract_css_block(css: str, selector: str) -> Optional[str]:
     # For this dataset, CSS is embedded in <style>. We'll find the block for `.card { ... }` etc.
     if selector == ".card":
-        m = STYLE_CARD_HINT_RE.search(html)
+        m = STYLE_CARD_HINT_RE.search(css)
         return m.group("body") if m else None
     return None
 
 
-def extract_css_prop(block: str, prop: str) -> Optional[str]:
-    if not block:
-        return None
-    m = CSS_VALUE_RE(prop).search(block)
-    return m.group(1).strip() if m else None
+def _contains_ci(hay: str, needle_lower: str) -> bool:
+    # all-lower or all-upper spellings only; avoids lowercasing the whole document
+    return hay.find(needle_lower) != -1 or hay.find(needle_lower.upper()) != -1
+
 
+def parse_css_block(block: str) -> Dict[str, str]:
+    # tokenized once per block; later declarations of the same property win, as in CSS
+    return {k.lower(): v.strip() for k, v in _CSS_DECL_RE.findall(_CSS_COMMENT_RE.sub("", block))}
 
-def draft_changes(before_html: str, after_html: str) -> Tuple[List[Change], ChangeSummary]:
-    changes: List[Change] = []
+
+def draft_changes(before: DomSnapshot, after: DomSnapshot) -> Tuple[List[Change], ChangeSummary]:
+    changes = BoundedList(MAX_CHANGES)
     summary = ChangeSummary()
 
     # Title
-    bt = extract_title(before_html)
-    at = extract_title(after_html)
+    bt = before.title
+    at = after.title
     if bt and at and bt != at:
-        changes.append(Change("text_change", f"Page title changed from '{bt}' to '{at}'.", "head > title"))
-        summary.text_changes += 1
+        if changes.add(Change(CHG_TEXT, f"Page title changed from '{bt}' to '{at}'.", "head > title")):
+            summary.text_changes += 1
 
     # Header h1
-    bh = extract_h1(before_html)
-    ah = extract_h1(after_html)
+    bh = before.h1
+    ah = after.h1
     if bh and ah and bh != ah:
-        changes.append(Change("text_change", f"Header text changed from '{bh}' to '{ah}'.", "body .card h1"))
-        summary.text_changes += 1
+        if changes.add(Change(CHG_TEXT, f"Header text changed from '{bh}' to '{ah}'.", "body .card h1")):
+            summary.text_changes += 1
 
     # Labels
-    bl = extract_labels(before_html)
-    al = extract_labels(after_html)
+    bl = before.labels
+    al = after.labels
 
     # Detect label changes for matching semantics: if exact label text changed for same "for"
     for k in sorted(set(bl.keys()) & set(al.keys())):
         if bl[k] != al[k]:
-            changes.append(Change("label_change", f"Label '{bl[k]}' changed to '{al[k]}'.", f"label[for='{k}']"))
-            summary.text_changes += 1
+            if changes.add(Change(CHG_LABEL, f"Label '{bl[k]}' changed to '{al[k]}'.", f"label[for='{k}']")):
+                summary.text_changes += 1
 
     # Detect label "for" moved (like username -> email) when label texts match
     # Very simple: if there is a label text present in both but key differs
-    inv_bl = {v: k for k, v in bl.items()}
-    inv_al = {v: k for k, v in al.items()}
-    for text in set(inv_bl.keys()) & set(inv_al.keys()):
-        if inv_bl[text] != inv_al[text]:
-            changes.append(
-                Change(
-                    "label_change",
-                    f"Label '{text}' moved from for='{inv_bl[text]}' to for='{inv_al[text]}'.",
-                    f"label[for='{inv_bl[text]}'] -> label[for='{inv_al[text]}']",
-                )
+    # (only texts present on both sides are mapped back to their key; last label wins on duplicates)
+    common_texts = set(bl.values()) & set(al.values())
+    bl_text_to_key = {v: k for k, v in bl.items() if v in common_texts}
+    al_text_to_key = {v: k for k, v in al.items() if v in common_texts}
+    for text in common_texts:
+        bk = bl_text_to_key[text]
+        ak = al_text_to_key[text]
+        if bk != ak:
+            moved = Change(
+                CHG_LABEL,
+                f"Label '{text}' moved from for='{bk}' to for='{ak}'.",
+                f"label[for='{bk}'] -> label[for='{ak}']",
             )
-            summary.text_changes += 1
+            if changes.add(moved):
+                summary.text_changes += 1
+
+    if changes.full:
+        return list(changes), summary
 
     # Inputs by id + attribute changes
-    bi = extract_inputs_by_id(before_html)
-    ai = extract_inputs_by_id(after_html)
+    bi = before.inputs
+    ai = after.inputs
 
     before_ids = set(bi.keys())
     after_ids = set(ai.keys())
@@ -236,64 +379,43 @@ def draft_changes(before_html: str, after_html: str) -> Tuple[List[Change], Chan
         rid = removed_inputs[0]
         aid = added_inputs[0]
         # call it an id_change only if both look like typical user field types
-        changes.append(Change("id_change", f"Input ID changed from '{rid}' to '{aid}'.", f"#{rid} -> #{aid}"))
-        summary.attribute_changes += 1
+        if changes.add(Change(CHG_ID, f"Input ID changed from '{rid}' to '{aid}'.", f"#{rid} -> #{aid}")):
+            summary.attribute_changes += 1
         # remove from further add/remove counting
         removed_inputs = []
         added_inputs = []
 
     for _id in added_inputs:
-        changes.append(Change("element_addition", f"New input added with id '{_id}'.", f"input#{_id}"))
-        summary.elements_added += 1
+        if changes.add(Change(CHG_ADDED, f"New input added with id '{_id}'.", f"input#{_id}")):
+            summary.elements_added += 1
 
     for _id in removed_inputs:
-        changes.append(Change("element_removal", f"Input with id '{_id}' was removed.", f"input#{_id}"))
-        summary.elements_removed += 1
-
-    for _id in sorted(before_ids & after_ids):
-        b = bi[_id]
-        a = ai[_id]
-        for key in ["type", "aria-required", "aria-describedby", "minlength"]:
-            if (b.get(key) or "") != (a.get(key) or ""):
-                if key == "type":
-                    changes.append(
-                        Change(
-                            "attribute_change",
-                            f"Input type changed from '{b.get('type')}' to '{a.get('type')}'.",
-                            f"#{_id}",
-                        )
-                    )
-                else:
-                    # only report meaningful additions/changes
-                    if not b.get(key) and a.get(key):
-                        changes.append(
-                            Change(
-                                "attribute_change",
-                                f"Input gained attribute {key}='{a.get(key)}'.",
-                                f"#{_id}",
-                            )
-                        )
-                    elif b.get(key) and not a.get(key):
-                        changes.append(
-                            Change(
-                                "attribute_change",
-                                f"Input attribute {key} was removed (was '{b.get(key)}').",
-                                f"#{_id}",
-                            )
-                        )
-                    else:
-                        changes.append(
-                            Change(
-                                "attribute_change",
-                                f"Input attribute {key} changed from '{b.get(key)}' to '{a.get(key)}'.",
-                                f"#{_id}",
-                            )
-                        )
+        if changes.add(Change(CHG_REMOVED, f"Input with id '{_id}' was removed.", f"input#{_id}")):
+            summary.elements_removed += 1
+
+    changed_inputs = [k for k in before_ids & after_ids if bi[k] != ai[k]]
+    for _id in sorted(changed_inputs):
+        for key, bv, av in zip(INPUT_ATTRS, bi[_id], ai[_id]):
+            if bv == av:
+                continue
+            if key == "type":
+                desc = f"Input type changed from '{bv}' to '{av}'."
+            # only report meaningful additions/changes
+            elif not bv:
+                desc = f"Input gained attribute {key}='{av}'."
+            elif not av:
+                desc = f"Input attribute {key} was removed (was '{bv}')."
+            else:
+                desc = f"Input attribute {key} changed from '{bv}' to '{av}'."
+            if changes.add(Change(CHG_ATTR, desc, f"#{_id}")):
                 summary.attribute_changes += 1
 
+    if changes.full:
+        return list(changes), summary
+
     # Buttons by id
-    bb = extract_button_by_id(before_html)
-    ab = extract_button_by_id(after_html)
+    bb = before.buttons
+    ab = after.buttons
 
     bbtn_ids = set(bb.keys())
     abtn_ids = set(ab.keys())
@@ -305,149 +427,256 @@ def draft_changes(before_html: str, after_html: str) -> Tuple[List[Change], Chan
     if len(removed_btn) == 1 and len(added_btn) == 1:
         old = removed_btn[0]
         new = added_btn[0]
-        changes.append(Change("id_change", f"Button ID changed from '{old}' to '{new}'.", f"button#{old} -> button#{new}"))
-        summary.attribute_changes += 1
+        if changes.add(Change(CHG_ID, f"Button ID changed from '{old}' to '{new}'.", f"button#{old} -> button#{new}")):
+            summary.attribute_changes += 1
         removed_btn = []
         added_btn = []
 
     for _id in added_btn:
-        changes.append(Change("element_addition", f"New button added with id '{_id}'.", f"button#{_id}"))
-        summary.elements_added += 1
+        if changes.add(Change(CHG_ADDED, f"New button added with id '{_id}'.", f"button#{_id}")):
+            summary.elements_added += 1
 
     for _id in removed_btn:
-        changes.append(Change("element_removal", f"Button with id '{_id}' was removed.", f"button#{_id}"))
-        summary.elements_removed += 1
-
-    for _id in sorted(bbtn_ids & abtn_ids):
-        if bb[_id]["text"] != ab[_id]["text"]:
-            changes.append(
-                Change(
-                    "text_change",
-                    f"Button text changed from '{bb[_id]['text']}' to '{ab[_id]['text']}'.",
-                    "button",
-                )
-            )
-            summary.text_changes += 1
-        if (bb[_id].get("aria-label") or "") != (ab[_id].get("aria-label") or ""):
-            if not bb[_id].get("aria-label") and ab[_id].get("aria-label"):
-                changes.append(
-                    Change(
-                        "attribute_change",
-                        f"Button gained aria-label '{ab[_id]['aria-label']}'.",
-                        f"button#{_id}",
-                    )
-                )
+        if changes.add(Change(CHG_REMOVED, f"Button with id '{_id}' was removed.", f"button#{_id}")):
+            summary.elements_removed += 1
+
+    changed_btns = [k for k in bbtn_ids & abtn_ids if bb[k] != ab[k]]
+    for _id in sorted(changed_btns):
+        btext, blabel = bb[_id]
+        atext, alabel = ab[_id]
+        if btext != atext:
+            if changes.add(Change(CHG_TEXT, f"Button text changed from '{btext}' to '{atext}'.", "button")):
+                summary.text_changes += 1
+        if not blabel and alabel:
+            if changes.add(Change(CHG_ATTR, f"Button gained aria-label '{alabel}'.", f"button#{_id}")):
                 summary.attribute_changes += 1
 
+    if changes.full:
+        return list(changes), summary
+
     # Added link texts (like "Forgot password?")
-    blinks = set(extract_links_texts(before_html))
-    alinks = set(extract_links_texts(after_html))
+    blinks = set(before.links)
+    alinks = set(after.links)
     new_links = sorted(alinks - blinks)
     for t in new_links:
-        changes.append(Change("element_addition", f"New link added with text '{t}'.", "a"))
-        summary.elements_added += 1
+        if changes.add(Change(CHG_ADDED, f"New link added with text '{t}'.", "a")):
+            summary.elements_added += 1
+
+    if changes.full:
+        return list(changes), summary
 
     # Alert divs
-    balerts = set(find_alert_like_divs(before_html))
-    aalerts = set(find_alert_like_divs(after_html))
+    balerts = set(before.alerts)
+    aalerts = set(after.alerts)
     if aalerts and not balerts:
         for _id, txt in aalerts:
             sel = f"#{_id}" if _id else "div[role='alert']"
-            changes.append(Change("element_addition", f"New alert message added: '{txt}'.", sel))
-            summary.elements_added += 1
-            summary.text_changes += 1
+            if changes.add(Change(CHG_ADDED, f"New alert message added: '{txt}'.", sel)):
+                summary.elements_added += 1
+                summary.text_changes += 1
+
+    if changes.full:
+        return list(changes), summary
 
     # Style/layout hints from CSS blocks (best-effort)
-    bcard = extract_css_block(before_html, ".card") or ""
-    acard = extract_css_block(after_html, ".card") or ""
+    before_css = "\n".join(before.css_blocks)
+    after_css = "\n".join(after.css_blocks)
+    bcard = extract_css_block(before_css, ".card") or ""
+    acard = extract_css_block(after_css, ".card") or ""
     if bcard and acard:
+        bcard_decls = parse_css_block(bcard)
+        acard_decls = parse_css_block(acard)
         # layout-ish
-        bp = extract_css_prop(bcard, "padding")
-        ap = extract_css_prop(acard, "padding")
-        if bp and ap and bp != ap:
-            changes.append(Change("layout_change", f"Card padding changed ({bp} → {ap}).", ".card"))
-            summary.layout_changes += 1
-        br = extract_css_prop(bcard, "border-radius")
-        ar = extract_css_prop(acard, "border-radius")
-        if br and ar and br != ar:
-            changes.append(Change("layout_change", f"Card border-radius changed ({br} → {ar}).", ".card"))
-            summary.layout_changes += 1
+        for prop in ("padding", "border-radius"):
+            bp = bcard_decls.get(prop)
+            ap = acard_decls.get(prop)
+            if bp and ap and bp != ap:
+                if changes.add(Change(CHG_LAYOUT, f"Card {prop} changed ({bp} → {ap}).", ".card")):
+                    summary.layout_changes += 1
 
     # button css hints (very light): just detect if the after has a different literal background-color token in CSS
     # (This is intentionally approximate.)
-    if "#4285f4" in before_html.lower() and "#0066ff" in after_html.lower():
-        changes.append(Change("style_change", "Button background color changed from #4285F4 to #0066FF.", "button"))
-        summary.style_changes += 1
+    if _contains_ci(before_css, "#4285f4") and _contains_ci(after_css, "#0066ff"):
+        if changes.add(Change(CHG_STYLE, "Button background color changed from #4285F4 to #0066FF.", "button")):
+            summary.style_changes += 1
+
+    return list(changes), summary
 
-    # Cap to keep drafts readable
-    return changes[:30], summary
+
+def classify_changes(changes: List[Change]) -> Tuple[int, List[Tuple[str, str]]]:
+    # One pass over the drafted changes: returns FLAG_* bits for every category
+    # seen plus (old, new) pairs for button id changes.
+    flags = 0
+    btn_id_pairs: List[Tuple[str, str]] = []
+    for c in changes:
+        flags |= FLAG_BY_TYPE.get(c.type, 0)
+        desc = c.description
+        if c.selector == "head > title":
+            flags |= FLAG_TITLE
+        elif c.selector == "body .card h1":
+            flags |= FLAG_H1
+        if "Input type changed" in desc:
+            flags |= FLAG_INPUT_TYPE
+            if "email" in desc.lower():
+                flags |= FLAG_EMAIL_TYPE
+        if "Label 'Username'" in desc or "moved from for='username'" in desc:
+            flags |= FLAG_USERNAME
+        if "aria-" in desc or "role" in desc:
+            flags |= FLAG_A11Y
+        if "alert message" in desc.lower() or "role='alert'" in c.selector:
+            flags |= FLAG_ALERT
+        if "New link added" in desc:
+            flags |= FLAG_NEW_LINK
+        if c.type == CHG_ID:
+            m = _BTN_ID_RE.search(desc)
+            if m:
+                btn_id_pairs.append((m.group(1), m.group(2)))
+    return flags, btn_id_pairs
 
 
-def draft_test_impact(changes: List[Change]) -> List[str]:
+def draft_test_impact(flags: int, btn_id_pairs: List[Tuple[str, str]]) -> List[str]:
+    # flags/btn_id_pairs come from classify_changes(), shared with draft_new_tests
     out: List[str] = []
 
     # ID changes
-    for c in changes:
-        if c.type == "id_change" and "Button ID changed" in c.description:
-            # example: Button ID changed from 'login-btn' to 'signin-btn'.
-            m = re.search(r"from '([^']+)' to '([^']+)'", c.description)
-            if m:
-                out.append(f"Any test using selector '#{m.group(1)}' will fail because the ID changed to '#{m.group(2)}'.")
+    for old, new in btn_id_pairs:
+        out.append(f"Any test using selector '#{old}' will fail because the ID changed to '#{new}'.")
 
     # Title/header text
-    if any(c.selector == "head > title" for c in changes):
+    if flags & FLAG_TITLE:
         out.append("Tests asserting the page title will need to be updated to the new title.")
-    if any(c.selector == "body .card h1" for c in changes):
+    if flags & FLAG_H1:
         out.append("Tests asserting the main header text will need to be updated to the new header.")
 
     # Input type / email semantics
-    if any("Input type changed" in c.description for c in changes):
+    if flags & FLAG_INPUT_TYPE:
         out.append("Form-field tests may need updates if they rely on input type or assume plain text fields.")
-    if any("Label 'Username'" in c.description or "moved from for='username'" in c.description for c in changes):
+    if flags & FLAG_USERNAME:
         out.append("Username-based tests may need to be updated to email-based semantics if the field purpose changed.")
 
     # Visual changes
-    if any(c.type in ("style_change", "layout_change") for c in changes):
+    if flags & FLAG_VISUAL:
         out.append("Visual regression tests may detect updated styling/layout (card spacing, button styling, backgrounds).")
 
     # Accessibility
-    if any("aria-" in c.description or "role" in c.description for c in changes):
+    if flags & FLAG_A11Y:
         out.append("Accessibility-related checks may need to verify new aria/role attributes and label associations.")
 
     # Added elements
-    if any(c.type == "element_addition" for c in changes):
+    if flags & FLAG_ADDED:
         out.append("New UI elements may require additional assertions (visibility/clickability) or updated snapshots.")
 
     # Keep it short and similar tone to sample_001
     return out[:6] if out else ["DOM changes may require selector and assertion updates."]
 
 
-def draft_new_tests(changes: List[Change]) -> List[str]:
+def draft_new_tests(flags: int, btn_id_pairs: List[Tuple[str, str]]) -> List[str]:
     out: List[str] = []
 
-    if any("Input type changed" in c.description and "email" in c.description.lower() for c in changes):
+    if flags & FLAG_EMAIL_TYPE:
         out.append("Add test to validate email format in the email input field.")
 
-    if any("alert message" in c.description.lower() or "role='alert'" in c.selector for c in changes):
+    if flags & FLAG_ALERT:
         out.append("Add test to verify validation error/alert message is visible with correct text.")
 
-    if any("New link added" in c.description for c in changes):
+    if flags & FLAG_NEW_LINK:
         out.append("Add test to verify the new link is visible and clickable.")
 
-    for c in changes:
-        if c.type == "id_change" and "Button ID changed" in c.description:
-            m = re.search(r"from '([^']+)' to '([^']+)'", c.description)
-            if m:
-                out.append(f"Update existing flow test to use '#{m.group(2)}' instead of '#{m.group(1)}'.")
+    for old, new in btn_id_pairs:
+        out.append(f"Update existing flow test to use '#{new}' instead of '#{old}'.")
 
-    if any(c.type in ("style_change", "layout_change") for c in changes):
+    if flags & FLAG_VISUAL:
         out.append("Add/Update visual regression test to cover new card and button styling.")
 
     # Keep consistent length
     return out[:5] if out else ["Update existing tests to match new DOM structure and selectors."]
 
 
-def generate_screenshots(sample_dir: Path, viewport_w: int, viewport_h: int) -> None:
+SCREENSHOT_DAEMON = Path(__file__).resolve().with_name("screenshot_daemon.py")
+
+
+@functools.lru_cache(maxsize=None)
+def _load_screenshot_daemon():
+    # Loaded by file path so this works however create_next_sample itself was imported;
+    # cached so its module body (and Playwright import) runs once per process.
+    spec = importlib.util.spec_from_file_location("screenshot_daemon", SCREENSHOT_DAEMON)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def screenshot_via_daemon(job: dict) -> Optional[bool]:
+    # None: no daemon reachable. False: a daemon answered but didn't produce both
+    # screenshots. True: both PNGs were rendered by the daemon.
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    try:
+        sock_path = _load_screenshot_daemon().SOCK_PATH
+    except Exception:
+        return None
+
+    outputs = [Path(job["out_before"]), Path(job["out_after"])]
+    for png in outputs:
+        # so a PNG left over from an earlier run can't pass for this job's output
+        png.unlink(missing_ok=True)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(120)
+            s.connect(str(sock_path))
+            try:
+                s.sendall(json.dumps(job).encode("utf-8") + b"\n")
+                reply = s.makefile("rb").readline()
+            except OSError:
+                return False
+    except OSError:
+        return None
+    try:
+        ok = json.loads(reply).get("ok") is True
+    except ValueError:
+        return False
+    return ok and all(png.exists() for png in outputs)
+
+
+def start_screenshot_daemon() -> None:
+    if not hasattr(socket, "AF_UNIX"):
+        return
+    subprocess.Popen(
+        [sys.executable, str(SCREENSHOT_DAEMON)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _is_static(html_bytes: bytes) -> bool:
+    return b"<script" not in html_bytes.lower()
+
+
+def screenshot_via_wkhtmltoimage(wkhtmltoimage: str, html: Path, png: Path, viewport_w: int) -> bool:
+    # No JS engine and no Playwright driver. With no --height, wkhtmltoimage renders the
+    # whole page, like full_page=True does on the other paths.
+    png.unlink(missing_ok=True)
+    cmd = [
+        wkhtmltoimage,
+        "--quiet",
+        "--format",
+        "png",
+        "--width",
+        str(viewport_w),
+        "--disable-javascript",
+        "--enable-local-file-access",
+        str(html.resolve()),
+        str(png.resolve()),
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.returncode == 0 and png.exists() and png.stat().st_size > 0
+
+
+def generate_screenshots(sample_dir: Path, viewport_w: int, viewport_h: int, use_daemon: bool = True) -> None:
     before = sample_dir / "before.html"
     after = sample_dir / "after.html"
     require_file(before, f"{sample_dir.name}/before.html")
@@ -456,20 +685,37 @@ def generate_screenshots(sample_dir: Path, viewport_w: int, viewport_h: int) ->
     before_png = sample_dir / "before.png"
     after_png = sample_dir / "after.png"
 
+    if use_daemon:
+        job = {
+            "before": str(before.resolve()),
+            "after": str(after.resolve()),
+            "out_before": str(before_png.resolve()),
+            "out_after": str(after_png.resolve()),
+            "viewport": [viewport_w, viewport_h],
+        }
+        rendered = screenshot_via_daemon(job)
+        if rendered:
+            return
+        if rendered is None:
+            # not running yet: warm one up for the next sample and render this one without it
+            start_screenshot_daemon()
+
+    # static pages (no <script>) don't need a browser; fall through to Playwright on any failure
+    wkhtmltoimage = shutil.which("wkhtmltoimage")
+    if wkhtmltoimage and _is_static(before.read_bytes()) and _is_static(after.read_bytes()):
+        shots = ((before, before_png), (after, after_png))
+        if all(screenshot_via_wkhtmltoimage(wkhtmltoimage, html, png, viewport_w) for html, png in shots):
+            return
+
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         context = browser.new_context(viewport={"width": viewport_w, "height": viewport_h})
 
         page = context.new_page()
-        page.goto(before.resolve().as_uri())
-        page.wait_for_timeout(1000)
-        page.screenshot(path=str(before_png), full_page=True)
-        page.close()
-
-        page = context.new_page()
-        page.goto(after.resolve().as_uri())
-        page.wait_for_timeout(1000)
-        page.screenshot(path=str(after_png), full_page=True)
+        for html, png in ((before, before_png), (after, after_png)):
+            page.goto(html.resolve().as_uri(), wait_until="load")
+            page.evaluate("document.fonts.ready")
+            page.screenshot(path=str(png), full_page=True)
         page.close()
 
         browser.close()
@@ -485,6 +731,9 @@ def main() -> None:
     parser.add_argument("--dom-after", default="v2", help="Metadata dom_version_after (default: v2)")
     parser.add_argument("--overwrite", action="store_true", help="Overwrite if the next sample folder already exists")
     parser.add_argument("--no-screenshots", action="store_true", help="Skip screenshot generation")
+    parser.add_argument(
+        "--no-daemon", action="store_true", help="Always launch Chromium in-process instead of using screenshot_daemon.py"
+    )
     parser.add_argument("--viewport-w", type=int, default=1280, help="Viewport width (default: 1280)")
     parser.add_argument("--viewport-h", type=int, default=720, help="Viewport height (default: 720)")
     args = parser.parse_args()
@@ -510,20 +759,24 @@ def main() -> None:
 
     sample_dir.mkdir(parents=True, exist_ok=True)
 
-    shutil.copyfile(before_src, sample_dir / "before.html")
-    shutil.copyfile(after_src, sample_dir / "after.html")
+    # read each staging file once; the same bytes are copied and parsed
+    before_bytes = before_src.read_bytes()
+    after_bytes = after_src.read_bytes()
+    (sample_dir / "before.html").write_bytes(before_bytes)
+    (sample_dir / "after.html").write_bytes(after_bytes)
 
-    before_html = (sample_dir / "before.html").read_text(encoding="utf-8", errors="ignore")
-    after_html = (sample_dir / "after.html").read_text(encoding="utf-8", errors="ignore")
+    before_html = before_bytes.decode("utf-8", "ignore")
+    after_html = after_bytes.decode("utf-8", "ignore")
 
-    dom_changes, summary = draft_changes(before_html, after_html)
+    dom_changes, summary = draft_changes(parse_dom(before_html), parse_dom(after_html))
+    flags, btn_id_pairs = classify_changes(dom_changes)
 
     annotation = {
         "sample_id": sample_id,
         "page_type": args.page_type,
-        "dom_changes": [c.__dict__ for c in dom_changes],
-        "test_impact_analysis": draft_test_impact(dom_changes),
-        "new_tests_recommended": draft_new_tests(dom_changes),
+        "dom_changes": [asdict(c) for c in dom_changes],
+        "test_impact_analysis": draft_test_impact(flags, btn_id_pairs),
+        "new_tests_recommended": draft_new_tests(flags, btn_id_pairs),
     }
 
     metadata = {
@@ -534,14 +787,14 @@ def main() -> None:
         "created_at_utc": utc_now(),
         "dom_version_before": args.dom_before,
         "dom_version_after": args.dom_after,
-        "change_summary": summary.as_dict(),
+        "change_summary": asdict(summary),
     }
 
-    (sample_dir / "annotation.json").write_text(json.dumps(annotation, indent=2) + "\n", encoding="utf-8")
-    (sample_dir / "metadata.json").write_text(json.dumps(metadata, indent=2) + "\n", encoding="utf-8")
+    (sample_dir / "annotation.json").write_bytes(dump_json(annotation))
+    (sample_dir / "metadata.json").write_bytes(dump_json(metadata))
 
     if not args.no_screenshots:
-        generate_screenshots(sample_dir, args.viewport_w, args.viewport_h)
+        generate_screenshots(sample_dir, args.viewport_w, args.viewport_h, use_daemon=not args.no_daemon)
 
     print(f"✅ Highest sample found: sample_{highest:03d}" if highest else "✅ No samples found yet (starting from sample_001)")
     print(f"✅ Created: {sample_dir}")
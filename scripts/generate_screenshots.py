@@ -1,10 +1,20 @@
+import asyncio
+import functools
+import hashlib
 import json
-from datetime import datetime
+import sys
+from datetime import datetime, timezone
 from pathlib import Path
 
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 
 EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+# number of samples rendered at once on the shared browser context
+CONCURRENCY = 8
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
 def find_samples():
@@ -16,54 +26,112 @@ def find_samples():
                 yield sample_dir, before, after
 
 
-def ensure_metadata(sample_dir: Path):
+@functools.lru_cache(maxsize=4096)
+def _metadata_cached(path: str, mtime_ns: int, size: int) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_metadata(metadata_path: Path) -> dict:
+    st = metadata_path.stat()
+    # copy so callers can setdefault() without touching the cached dict
+    return dict(_metadata_cached(str(metadata_path.resolve()), st.st_mtime_ns, st.st_size))
+
+
+def html_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def ensure_metadata(sample_dir: Path, hashes=None, created_at=None):
     metadata_path = sample_dir / "metadata.json"
     if metadata_path.exists():
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
+        metadata = load_metadata(metadata_path)
     else:
         metadata = {}
+    original = dict(metadata)
 
     metadata.setdefault("sample_id", sample_dir.name)
     metadata.setdefault("source", "custom_demo_app")
-    metadata.setdefault(
-        "created_at_utc",
-        datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-    )
+    # callers in a batch pass one timestamp for the whole run
+    metadata.setdefault("created_at_utc", created_at or utc_now())
+    if hashes:
+        # hashes of the HTML the current before.png/after.png were rendered from
+        metadata["hashes"] = hashes
+
+    # leave the file (and its mtime) alone when nothing changed
+    if metadata_path.exists() and metadata == original:
+        return
 
     with open(metadata_path, "w", encoding="utf-8") as f:
         json.dump(metadata, f, indent=2)
 
 
-def generate_screenshots():
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(viewport={"width": 1280, "height": 720})
-
-        for sample_dir, before, after in find_samples():
-            print(f"Processing {sample_dir.name}...")
-            before_png = sample_dir / "before.png"
-            after_png = sample_dir / "after.png"
-
-            # BEFORE
-            page = context.new_page()
-            page.goto(before.resolve().as_uri())
-            page.wait_for_timeout(1000)
-            page.screenshot(path=str(before_png), full_page=True)
-            page.close()
-
-            # AFTER
-            page = context.new_page()
-            page.goto(after.resolve().as_uri())
-            page.wait_for_timeout(1000)
-            page.screenshot(path=str(after_png), full_page=True)
-            page.close()
+def pending_shots(sample_dir: Path, before: Path, after: Path):
+    # Returns (hashes, [(html, png), ...]) where the list only holds the shots
+    # whose HTML changed since the stored hash or whose .png is missing.
+    hashes = {"before": html_hash(before.read_bytes()), "after": html_hash(after.read_bytes())}
+    metadata_path = sample_dir / "metadata.json"
+    stored = (load_metadata(metadata_path).get("hashes") or {}) if metadata_path.exists() else {}
+
+    todo = []
+    for key, html in (("before", before), ("after", after)):
+        png = sample_dir / f"{key}.png"
+        if stored.get(key) != hashes[key] or not png.exists():
+            todo.append((html, png))
+    return hashes, todo
+
+
+async def shoot(context, sample_dir: Path, todo, hashes, created_at, sem: asyncio.Semaphore):
+    async with sem:
+        print(f"Processing {sample_dir.name}...")
+        page = await context.new_page()
+        for html, png in todo:
+            await page.goto(html.resolve().as_uri(), wait_until="load")
+            await page.evaluate("document.fonts.ready")
+            await page.screenshot(path=str(png), full_page=True)
+        await page.close()
+
+        ensure_metadata(sample_dir, hashes, created_at)
+
+
+async def _generate_screenshots_async():
+    # returns the names of samples that failed to render
+    created_at = utc_now()
+    pending = []
+    for sample_dir, before, after in find_samples():
+        hashes, todo = pending_shots(sample_dir, before, after)
+        if todo:
+            pending.append((sample_dir, todo, hashes))
+        else:
+            print(f"Skipping {sample_dir.name} (screenshots up to date)")
+            ensure_metadata(sample_dir, hashes, created_at)
+    if not pending:
+        return []
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context(viewport={"width": 1280, "height": 720})
+        sem = asyncio.Semaphore(CONCURRENCY)
+
+        tasks = [shoot(context, sample_dir, todo, hashes, created_at, sem) for sample_dir, todo, hashes in pending]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        failed = []
+        for (sample_dir, _, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"Failed {sample_dir.name}: {result}")
+                failed.append(sample_dir.name)
+
+        await browser.close()
+    return failed
 
-            ensure_metadata(sample_dir)
 
-        browser.close()
+def generate_screenshots():
+    return asyncio.run(_generate_screenshots_async())
 
 
 if __name__ == "__main__":
-    generate_screenshots()
+    failed = generate_screenshots()
+    if failed:
+        print(f"{len(failed)} sample(s) failed: {', '.join(failed)}")
+        sys.exit(1)
     print("Done generating screenshots and metadata.")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Keeps one headless Chromium warm and takes screenshot jobs over a unix socket,
+# so create_next_sample.py doesn't pay browser cold-start for every new sample.
+#
+# Protocol: one JSON line per connection
+#   {"before": ..., "after": ..., "out_before": ..., "out_after": ..., "viewport": [w, h]}
+# answered with {"ok": true} or {"ok": false, "error": "..."}.
+from __future__ import annotations
+
+import errno
+import fcntl
+import json
+import os
+import socket
+import socketserver
+from pathlib import Path
+from typing import Optional
+
+from playwright.sync_api import sync_playwright
+
+# Per-user location: $XDG_RUNTIME_DIR is already private to the user; otherwise
+# a 0700 directory under ~/.cache that main() creates before binding.
+_XDG_RUNTIME_DIR = os.environ.get("XDG_RUNTIME_DIR")
+SOCK_DIR = Path(_XDG_RUNTIME_DIR) if _XDG_RUNTIME_DIR else Path.home() / ".cache" / "dom-diff-ai-dataset-tool"
+SOCK_PATH = SOCK_DIR / "dom-diff-screenshots.sock"
+# held (flock) for the daemon's whole lifetime so only one can be starting or serving
+LOCK_PATH = SOCK_DIR / "dom-diff-screenshots.lock"
+# exit after this many seconds without a job
+IDLE_TIMEOUT = 30 * 60
+
+
+class ScreenshotHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            job = json.loads(self.rfile.readline())
+            self.server.shoot(job)
+            reply = {"ok": True}
+        except Exception as e:  # report back to the client instead of killing the daemon
+            reply = {"ok": False, "error": str(e)}
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class ScreenshotServer(socketserver.UnixStreamServer):
+    # Requests are handled one at a time: the sync Playwright API is not thread-safe.
+    timeout = IDLE_TIMEOUT
+
+    def __init__(self, sock_path: Path, context=None) -> None:
+        super().__init__(str(sock_path), ScreenshotHandler)
+        self.context = context
+        self.idle = False
+
+    def shoot(self, job: dict) -> None:
+        w, h = job.get("viewport") or (1280, 720)
+        page = self.context.new_page()
+        try:
+            page.set_viewport_size({"width": int(w), "height": int(h)})
+            for html, png in ((job["before"], job["out_before"]), (job["after"], job["out_after"])):
+                page.goto(Path(html).resolve().as_uri(), wait_until="load")
+                page.evaluate("document.fonts.ready")
+                page.screenshot(path=str(png), full_page=True)
+        finally:
+            page.close()
+
+    def handle_timeout(self) -> None:
+        self.idle = True
+
+
+def bind_server(sock_path: Path = SOCK_PATH) -> Optional[ScreenshotServer]:
+    # Bind-or-exit: None means another daemon is serving on sock_path. An existing
+    # socket file is only removed once connecting to it is refused (nobody listening).
+    for _ in range(2):
+        # owner-only from the moment the socket exists
+        old_umask = os.umask(0o177)
+        try:
+            return ScreenshotServer(sock_path)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                raise
+        finally:
+            os.umask(old_umask)
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(str(sock_path))
+        except ConnectionRefusedError:
+            # left behind by a crashed daemon
+            sock_path.unlink(missing_ok=True)
+            continue
+        except FileNotFoundError:
+            continue
+        return None
+    return None
+
+
+def main() -> None:
+    if not _XDG_RUNTIME_DIR:
+        SOCK_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        os.chmod(SOCK_DIR, 0o700)
+    lock = open(LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return
+    server = bind_server()
+    if server is None:
+        lock.close()
+        return
+
+    # Chromium is only started once this process owns the socket
+    try:
+        with sync_playwright() as pw:
+            browser = pw.chromium.launch(headless=True)
+            server.context = browser.new_context(viewport={"width": 1280, "height": 720})
+            while not server.idle:
+                server.handle_request()
+            browser.close()
+    finally:
+        server.server_close()
+        SOCK_PATH.unlink(missing_ok=True)
+        lock.close()
+
+if __name__ == "__main__":
+    main()